@@ -12,12 +12,16 @@ import numpy as np
 import scipy as sp
 import re
 import io
+import os
 import requests
+from itertools import product
+from functools import reduce
 from skimage.external import tifffile as tif
 from scipy.optimize import minimize_scalar, minimize
 from scipy.ndimage.fourier import fourier_gaussian
 from scipy.ndimage._ni_support import _normalize_sequence
 from scipy.signal import signaltools as sig
+from scipy.fftpack import next_fast_len
 from scipy.special import zeta
 from scipy.stats import nbinom
 
@@ -35,12 +39,26 @@ try:
                                              rfftn, irfftn)
     # Turn on the cache for optimum performance
     pyfftw.interfaces.cache.enable()
+    # and keep plans alive between calls
+    pyfftw.interfaces.cache.set_keepalive_time(60)
     FFTW = True
 except ImportError:
     from numpy.fft import (fftshift, ifftshift, fftn, ifftn,
                            rfftn, irfftn)
     FFTW = False
+
+try:
+    from numba import njit, prange, get_num_threads
+    NUMBA = True
+except ImportError:
+    NUMBA = False
 eps = np.finfo(float).eps
+# default number of threads for FFTW, respecting any CPU affinity
+try:
+    _NTHREADS = len(os.sched_getaffinity(0))
+except AttributeError:
+    # not available on all platforms
+    _NTHREADS = os.cpu_count() or 1
 
 
 def get_git(path="."):
@@ -105,7 +123,7 @@ def bin_ndarray(ndarray, new_shape=None, bin_size=None, operation='sum'):
     return ndarray
 
 
-def scale(data, dtype=None):
+def scale(data, dtype=None, has_nan=True):
     """
     Scales data to [0.0, 1.0] range, unless an integer dtype is specified
     in which case the data is scaled to fill the bit depth of the dtype.
@@ -116,6 +134,9 @@ def scale(data, dtype=None):
         Data to be scaled, can contain nan
     dtype : integer dtype
         Specify the bit depth to fill
+    has_nan : bool
+        Whether data may contain nan, if False the faster non-nan aware
+        min and max are used
 
     Returns
     -------
@@ -139,15 +160,28 @@ def scale(data, dtype=None):
     """
     if np.issubdtype(data.dtype, np.complexfloating):
         raise TypeError("`scale` is not defined for complex values")
-    dmin = np.nanmin(data)
-    dmax = np.nanmax(data)
+    if has_nan:
+        dmin = np.nanmin(data)
+        dmax = np.nanmax(data)
+    else:
+        dmin = data.min()
+        dmax = data.max()
     if np.issubdtype(dtype, np.integer):
         tmin = np.iinfo(dtype).min
         tmax = np.iinfo(dtype).max
     else:
         tmin = 0.0
         tmax = 1.0
-    return ((data - dmin) / (dmax - dmin) * (tmax - tmin) + tmin).astype(dtype)
+    # the subtraction makes the only copy, the rest is done in place
+    if np.issubdtype(data.dtype, np.floating):
+        scaled = data - dmin
+    else:
+        scaled = np.subtract(data, dmin, dtype=float)
+    # promote the range so integer extrema can't overflow
+    scaled /= float(dmax) - float(dmin)
+    scaled *= tmax - tmin
+    scaled += tmin
+    return scaled.astype(dtype, copy=False)
 
 
 def scale_uint16(data):
@@ -188,25 +222,40 @@ def radial_profile(data, center=None, binsize=1.0):
         # mag_prof, mag_std = radial_profile(np.abs(data), center, binsize)
         # phase_prof, phase_std = radial_profile(np.angle(data), center, binsize)
         # return mag_prof * np.exp(phase_prof * 1j), mag_std * np.exp(phase_std * 1j)
-    # pull the data shape
-    idx = np.indices((data.shape))
     if center is None:
         # find the center
         center = np.array(data.shape) // 2
     else:
         # make sure center is an array.
         center = np.asarray(center)
+    # empty images would leave no rows to split into bands
+    if NUMBA and data.ndim == 2 and data.size:
+        # the largest radius is always at one of the corners
+        corners = np.array(list(product(*((0, n - 1) for n in data.shape))))
+        rmax = np.sqrt(((corners - center)**2).sum(1)).max()
+        nbins = int(np.round(rmax / binsize)) + 1
+        # accumulate counts, sums and sums of squares in a single pass, each
+        # band of rows into its own histograms which are then merged
+        nbands = min(get_num_threads(), data.shape[0])
+        nr, tbin, tbin2 = _radial_accum(data, float(center[0]), float(center[1]),
+                                        float(binsize), nbins, nbands).sum(0)
+        radial_mean = tbin / nr
+        radial_std = np.sqrt(tbin2 / nr - radial_mean**2)
+        return radial_mean, radial_std
+    # open grids broadcast against each other so the full index arrays
+    # are never built
+    grids = np.ogrid[tuple(slice(n) for n in data.shape)]
     # calculate the radius from center
-    idx2 = idx - center[[Ellipsis] + [np.newaxis] * (data.ndim)]
-    r = np.sqrt(np.sum([i**2 for i in idx2], 0))
+    r = np.sqrt(sum((g - c)**2 for g, c in zip(grids, center)))
     # convert to int
-    r = np.round(r / binsize).astype(np.int)
+    r = np.round(r / binsize).astype(np.intp).ravel()
     # sum the values at equal r
-    tbin = np.bincount(r.ravel(), data.ravel())
-    # sum the squares at equal r
-    tbin2 = np.bincount(r.ravel(), (data**2).ravel())
+    tbin = np.bincount(r, data.ravel())
+    # sum the squares at equal r, squaring straight to doubles (which
+    # bincount needs anyway) saves a copy and can't overflow integer data
+    tbin2 = np.bincount(r, np.square(data, dtype=float).ravel())
     # find how many equal r's there are
-    nr = np.bincount(r.ravel())
+    nr = np.bincount(r)
     # calculate the radial mean
     # NOTE: because nr could be zero (for missing bins) the results will
     # have NaN for binsize != 1
@@ -217,6 +266,31 @@ def radial_profile(data, center=None, binsize=1.0):
     return radial_mean, radial_std
 
 
+if NUMBA:
+    @njit(parallel=True, cache=True)
+    def _radial_accum(data, y0, x0, binsize, nbins, nbands):
+        """Bin count, sum and sum of squares of 2D data by radius
+
+        The rows are split into `nbands` bands that are processed in
+        parallel, each with its own histograms so no two threads ever write
+        to the same bin. Returns an array of shape (nbands, 3, nbins).
+        """
+        ny, nx = data.shape
+        hists = np.zeros((nbands, 3, nbins))
+        for b in prange(nbands):
+            for i in range(b * ny // nbands, (b + 1) * ny // nbands):
+                for j in range(nx):
+                    # same rounding as the numpy version
+                    r = round(np.sqrt((i - y0)**2 + (j - x0)**2) / binsize)
+                    # float() keeps float32 in numba, square in doubles
+                    # like the numpy version
+                    d = np.float64(data[i, j])
+                    hists[b, 0, r] += 1
+                    hists[b, 1, r] += d
+                    hists[b, 2, r] += d * d
+        return hists
+
+
 def mode(data):
     """Quickly find the mode of data
 
@@ -284,13 +358,17 @@ def slice_maker(xs, ws):
     return tuple(toreturn)
 
 
+# np.pad modes that fill with a statistic of the data
+_stat_modes = {"maximum", "minimum", "mean", "median"}
+
+
 def fft_pad(array, newshape=None, mode='median', **kwargs):
     """Pad an array to prep it for fft"""
     # pull the old shape
     oldshape = array.shape
     if newshape is None:
         # update each dimension to a 5-smooth hamming number
-        newshape = tuple(sig.fftpack.helper.next_fast_len(n) for n in oldshape)
+        newshape = tuple(next_fast_len(n) for n in oldshape)
     else:
         if isinstance(newshape, int):
             newshape = tuple(newshape for n in oldshape)
@@ -298,7 +376,28 @@ def fft_pad(array, newshape=None, mode='median', **kwargs):
             newshape = tuple(newshape)
     # generate padding and slices
     padding, slices = padding_slices(oldshape, newshape)
-    return np.pad(array[slices], padding, mode=mode, **kwargs)
+    array = array[slices]
+    if not any(any(p) for p in padding):
+        # only cropping, skip np.pad (and any statistics it would compute)
+        return array.copy()
+    if mode == "constant" and set(kwargs) <= {"constant_values"}:
+        value = kwargs.get("constant_values", 0)
+        if np.ndim(value) == 0:
+            # a single allocation and copy is much faster than np.pad,
+            # assigning the value (rather than np.full) casts it the same
+            # way np.pad does, so e.g. nan into integers still raises
+            padded = np.empty(newshape, dtype=array.dtype)
+            padded[...] = value
+            center = tuple(slice(before, before + n)
+                           for (before, after), n in zip(padding, array.shape))
+            padded[center] = array
+            return padded
+    if mode in _stat_modes and "stat_length" not in kwargs:
+        # np.pad computes the statistic along every axis, even those that
+        # aren't padded, so only look at a single value for those.
+        kwargs["stat_length"] = tuple((n, n) if any(p) else (1, 1)
+                                      for n, p in zip(array.shape, padding))
+    return np.pad(array, padding, mode=mode, **kwargs)
 
 
 def padding_slices(oldshape, newshape):
@@ -388,9 +487,21 @@ def _calc_pad(oldnum, newnum):
     return pad1, pad2
 
 
+def _multiply_spectra(sp1, sp2):
+    """Multiply two freshly computed spectra in place
+
+    The product is written into whichever input already has the result
+    dtype so that no extra complex array is allocated.
+    """
+    if sp1.dtype != np.result_type(sp1, sp2):
+        sp1, sp2 = sp2, sp1
+    sp1 *= sp2
+    return sp1
+
+
 # If we have fftw installed than make a better fftconvolve
 if FFTW:
-    def fftconvolve(in1, in2, mode="same", threads=1):
+    def fftconvolve(in1, in2, mode="same", threads=_NTHREADS):
         """Same as above but with pyfftw added in"""
         in1 = np.asarray(in1)
         in2 = np.asarray(in2)
@@ -414,7 +525,7 @@ if FFTW:
             in1, s1, in2, s2 = in2, s2, in1, s1
 
         # Speed up FFT by padding to optimal size for FFTPACK
-        fshape = [sig.fftpack.helper.next_fast_len(int(d)) for d in shape]
+        fshape = [next_fast_len(int(d)) for d in shape]
         fslice = tuple([slice(0, int(sz)) for sz in shape])
         # Pre-1.9 NumPy FFT routines are not threadsafe.  For older NumPys, make
         # sure we only call rfftn/irfftn from one thread at a time.
@@ -422,7 +533,8 @@ if FFTW:
             try:
                 sp1 = rfftn(in1, fshape, threads=threads)
                 sp2 = rfftn(in2, fshape, threads=threads)
-                ret = (irfftn(sp1 * sp2, fshape, threads=threads)[fslice].copy())
+                sp1 = _multiply_spectra(sp1, sp2)
+                ret = (irfftn(sp1, fshape, threads=threads)[fslice].copy())
             finally:
                 if not sig._rfft_mt_safe:
                     sig._rfft_lock.release()
@@ -433,7 +545,8 @@ if FFTW:
             # (threadsafe but slower) SciPy complex-FFT routines instead.
             sp1 = fftn(in1, fshape, threads=threads)
             sp2 = fftn(in2, fshape, threads=threads)
-            ret = ifftn(sp1 * sp2, threads=threads)[fslice].copy()
+            sp1 = _multiply_spectra(sp1, sp2)
+            ret = ifftn(sp1, threads=threads)[fslice].copy()
             if not complex_result:
                 ret = ret.real
 
@@ -463,12 +576,14 @@ def fftconvolve_fast(data, kernel, **kwargs):
     # TODO: add error checking like in the above and add functionality
     # for complex inputs. Also could add options for different types of
     # padding.
+    if FFTW:
+        kwargs.setdefault("threads", _NTHREADS)
     dshape = np.array(data.shape)
     kshape = np.array(kernel.shape)
     # find maximum dimensions
     maxshape = np.max((dshape, kshape), 0)
     # calculate a nice shape
-    fshape = [sig.fftpack.helper.next_fast_len(int(d)) for d in maxshape]
+    fshape = [next_fast_len(int(d)) for d in maxshape]
     # pad out with reflection
     pad_data = fft_pad(data, fshape, "reflect")
     # calculate padding
@@ -484,7 +599,8 @@ def fftconvolve_fast(data, kernel, **kwargs):
         kernel = fft_pad(kernel, pad_data.shape, mode='constant')
     k_kernel = rfftn(ifftshift(kernel), pad_data.shape, **kwargs)
     k_data = rfftn(pad_data, pad_data.shape, **kwargs)
-    convolve_data = irfftn(k_kernel * k_data, pad_data.shape, **kwargs)
+    k_data = _multiply_spectra(k_kernel, k_data)
+    convolve_data = irfftn(k_data, pad_data.shape, **kwargs)
     # return data with same shape as original data
     return convolve_data[fslice]
 
@@ -506,21 +622,8 @@ def win_nd(size, win_func=sp.signal.hann, **kwargs):
     w : ndarray
         window function
     """
-    ndim = len(size)
-    newshapes = tuple([
-        tuple([1 if i != j else k for i in range(ndim)])
-        for j, k in enumerate(size)])
-
-    # Initialize to return
-    toreturn = 1.0
-
-    # cross product the 1D windows together
-    for newshape in newshapes:
-        toreturn = toreturn * win_func(max(newshape), **kwargs
-                                       ).reshape(newshape)
-
-    # return
-    return toreturn
+    # outer product of the 1D windows
+    return reduce(np.multiply.outer, [win_func(k, **kwargs) for k in size])
 
 
 def anscombe(data):
@@ -528,7 +631,9 @@ def anscombe(data):
 
     https://en.wikipedia.org/wiki/Anscombe_transform
     """
-    return 2 * np.sqrt(data + 3 / 8)
+    result = np.sqrt(data + 3 / 8)
+    result *= 2
+    return result
 
 
 def anscombe_inv(data):
@@ -536,14 +641,19 @@ def anscombe_inv(data):
 
     https://en.wikipedia.org/wiki/Anscombe_transform
     """
-    part0 = 1 / 4 * data**2
-    part1 = 1 / 4 * np.sqrt(3 / 2) / data
-    part2 = -11 / 8 / (data**2)
-    part3 = 5 / 8 * np.sqrt(3 / 2) / (data**3)
-    return part0 + part1 + part2 + part3 - 1 / 8
-
-
-def fft_gaussian_filter(img, sigma):
+    # the inverse powers are evaluated Horner style with one reciprocal
+    inv = 1 / data
+    result = 5 / 8 * np.sqrt(3 / 2) * inv
+    result += -11 / 8
+    result *= inv
+    result += 1 / 4 * np.sqrt(3 / 2)
+    result *= inv
+    result += 1 / 4 * data**2 - 1 / 8
+    return result
+
+
+def fft_gaussian_filter(img, sigma, threads=_NTHREADS,
+                        planner_effort="FFTW_ESTIMATE"):
     """FFT gaussian convolution
 
     Parameters
@@ -552,6 +662,12 @@ def fft_gaussian_filter(img, sigma):
         Image to convolve with a gaussian kernel
     sigma : int or sequence
         The sigma(s) of the gaussian kernel in _real space_
+    threads : int
+        Number of threads for FFTW to use, ignored without pyFFTW
+    planner_effort : str
+        FFTW planner effort, plans are cached so a higher effort only pays
+        off when filtering many images of the same shape. Ignored without
+        pyFFTW
 
     Returns
     -------
@@ -564,7 +680,7 @@ def fft_gaussian_filter(img, sigma):
     # s2 = np.array([int(s * 4) for s in _normalize_sequence(sigma, img.ndim)])
     shape = s1  # + s2 - 1
     # calculate a nice shape
-    fshape = [sig.fftpack.helper.next_fast_len(int(d)) for d in shape]
+    fshape = [next_fast_len(int(d)) for d in shape]
     # pad out with reflection
     pad_img = fft_pad(img, fshape, "reflect")
     # calculate the padding
@@ -573,11 +689,15 @@ def fft_gaussian_filter(img, sigma):
     # into `fft_pad` ...
     fslice = tuple(slice(s, -e) if e != 0 else slice(s, None)
                    for s, e in padding)
+    if FFTW:
+        fft_kwargs = dict(threads=threads, planner_effort=planner_effort)
+    else:
+        fft_kwargs = {}
     # fourier transfrom and apply the filter
-    kimg = rfftn(pad_img, fshape)
+    kimg = rfftn(pad_img, fshape, **fft_kwargs)
     filt_kimg = fourier_gaussian(kimg, sigma, pad_img.shape[-1])
     # inverse FFT and return.
-    return irfftn(filt_kimg, fshape)[fslice]
+    return irfftn(filt_kimg, fshape, **fft_kwargs)[fslice]
 
 
 def multi_exp(xdata, *args):
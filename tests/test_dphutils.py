@@ -1,12 +1,13 @@
 from nose.tools import *
 import numpy as np
 from numpy.testing import (assert_allclose, assert_almost_equal,
-                           assert_approx_equal)
+                           assert_approx_equal, assert_array_equal)
 from itertools import product
 import unittest
 from scipy.signal import signaltools as sig
 from scipy.ndimage.filters import gaussian_filter
 # import the package to test
+import dphutils
 from dphutils import *
 
 
@@ -100,6 +101,68 @@ def test_radprof_complex():
     assert_allclose(result[1], std)
 
 
+def _radial_profile_numpy(data, center=None, binsize=1.0):
+    """Run radial_profile with the numba path switched off"""
+    numba = dphutils.NUMBA
+    dphutils.NUMBA = False
+    try:
+        return radial_profile(data, center, binsize)
+    finally:
+        dphutils.NUMBA = numba
+
+
+def test_radprof_numba():
+    """Make sure the numba and numpy radial profiles agree"""
+    if not dphutils.NUMBA:
+        raise unittest.SkipTest("numba is not installed")
+    # non-square on purpose
+    data = np.random.randn(37, 52)
+    data_uint8 = (np.random.random((37, 52)) * 255).astype(np.uint8)
+    # large mean, small spread, loses everything if squared in single
+    data_float32 = (1e4 + np.random.randn(37, 52)).astype(np.float32)
+    cases = (
+        (data, None, 1.0),  # default center
+        (data, (12.3, 30.7), 1.0),  # off grid center
+        (data, (-5.5, 60.2), 1.0),  # center outside image
+        (data, (18, 26), 0.7),  # binsize < 1, some empty bins
+        (data, (10.2, 40.9), 2.5),  # binsize > 1
+        (data_uint8, (12.3, 30.7), 1.5),  # integer data
+        (data_float32, (12.3, 30.7), 1.0),  # single precision data
+    )
+    # empty bins give nan in both versions
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for d, center, binsize in cases:
+            expected = _radial_profile_numpy(d, center, binsize)
+            result = radial_profile(d, center, binsize)
+            msg = "center = {}, binsize = {}".format(center, binsize)
+            assert_equal(result[0].shape, expected[0].shape, msg)
+            assert_allclose(result[0], expected[0], err_msg=msg)
+            assert_allclose(result[1], expected[1], atol=1e-5, err_msg=msg)
+
+
+def test_radial_accum_bands():
+    """Make sure splitting the rows into bands doesn't change the result"""
+    if not dphutils.NUMBA:
+        raise unittest.SkipTest("numba is not installed")
+    data = np.random.randn(37, 52)
+    nbins = 50
+    expected = dphutils._radial_accum(data, 12.3, 30.7, 1.0, nbins, 1)[0]
+    # more bands than rows leaves some of them empty
+    for nbands in (2, 3, data.shape[0] + 5):
+        result = dphutils._radial_accum(data, 12.3, 30.7, 1.0, nbins, nbands)
+        assert_equal(result.shape, (nbands, 3, nbins))
+        assert_allclose(result.sum(0), expected,
+                        err_msg="nbands = {}".format(nbands))
+
+
+def test_radprof_empty():
+    """Make sure an empty image gives empty profiles"""
+    for shape in ((0, 5), (5, 0)):
+        radial_mean, radial_std = radial_profile(np.zeros(shape))
+        assert_equal(radial_mean.shape, (0,))
+        assert_equal(radial_std.shape, (0,))
+
+
 def test_win_nd():
     """Testing the size of win_nd"""
     shape = (128, 65, 17)
@@ -118,6 +181,21 @@ def test_anscombe():
     assert_almost_equal((in_ans_data - data).var(), 0, 4)
 
 
+def test_scale_has_nan():
+    """Make sure has_nan doesn't change the result for nan free data"""
+    data = np.random.randn(64, 64)
+    for dtype in (None, np.uint8, np.uint16):
+        assert_array_equal(scale(data, dtype),
+                           scale(data, dtype, has_nan=False))
+
+
+def test_scale_integer():
+    """Make sure integer data doesn't wrap around"""
+    data = np.array([-128, 0, 127], dtype=np.int8)
+    assert_allclose(scale(data), (0, 128 / 255, 1))
+    assert_array_equal(scale(data, np.uint8), (0, 128, 255))
+
+
 # need to move these into a test class
 def test_fft_gaussian_filter():
     """Test the gaussian filter"""
@@ -184,6 +262,48 @@ def test_padding_slices():
     padding, slices = padding_slices(newshape, oldshape)
     assert np.all(data == new_data[slices])
 
+
+def test_fft_pad_np_pad():
+    """Make sure fft_pad agrees with np.pad for all its shortcuts"""
+    oldshape = (17, 10, 24)
+    newshapes = (
+        (20, 16, 31),  # pad every axis
+        (17, 15, 24),  # pad some axes
+        (12, 15, 24),  # pad and crop
+        (12, 7, 24),  # crop only
+        oldshape,  # nothing to do
+    )
+    modes = (
+        ("constant", {}),
+        ("constant", dict(constant_values=3)),
+        ("constant", dict(constant_values=2.5)),
+        ("constant", dict(constant_values=((1, 2), (3, 4), (5, 6)))),
+        ("median", {}),
+        ("mean", {}),
+        ("maximum", {}),
+        ("minimum", {}),
+        ("median", dict(stat_length=2)),
+    )
+    dtypes = (np.float64, np.float32, np.int16, np.uint8)
+    for newshape, (mode, kwargs), dtype in product(newshapes, modes, dtypes):
+        data = (np.random.random(oldshape) * 100).astype(dtype)
+        padding, slices = padding_slices(oldshape, newshape)
+        expected = np.pad(data[slices], padding, mode=mode, **kwargs)
+        result = fft_pad(data, newshape, mode, **kwargs)
+        msg = "newshape = {}, mode = {}, kwargs = {}, dtype = {}".format(
+            newshape, mode, kwargs, dtype)
+        assert_equal(result.dtype, expected.dtype, msg)
+        assert_array_equal(result, expected, err_msg=msg)
+
+
+def test_fft_pad_constant_cast():
+    """Make sure fft_pad refuses values np.pad can't cast either"""
+    data = np.ones((10, 10), dtype=np.int16)
+    assert_raises(ValueError, np.pad, data, 2, mode="constant",
+                  constant_values=np.nan)
+    assert_raises(ValueError, fft_pad, data, (14, 14), "constant",
+                  constant_values=np.nan)
+
 class TestFFTPad(unittest.TestCase):
     """This is not even close to testing edge cases"""
 
@@ -67,7 +67,9 @@ def ufftn(inarray, dim=None):
     if dim is None:
         dim = inarray.ndim
     outarray = fftn(inarray, axes=range(-dim, 0))
-    return outarray / np.sqrt(np.prod(inarray.shape[-dim:]))
+    # scale in place, the transform output is a fresh array
+    outarray /= np.sqrt(np.prod(inarray.shape[-dim:]))
+    return outarray
 
 
 def uifftn(inarray, dim=None):
@@ -98,7 +100,8 @@ def uifftn(inarray, dim=None):
     if dim is None:
         dim = inarray.ndim
     outarray = ifftn(inarray, axes=range(-dim, 0))
-    return outarray * np.sqrt(np.prod(inarray.shape[-dim:]))
+    outarray *= np.sqrt(np.prod(inarray.shape[-dim:]))
+    return outarray
 
 
 def urfftn(inarray, dim=None):
@@ -138,7 +141,8 @@ def urfftn(inarray, dim=None):
     if dim is None:
         dim = inarray.ndim
     outarray = rfftn(inarray, axes=range(-dim, 0))
-    return outarray / np.sqrt(np.prod(inarray.shape[-dim:]))
+    outarray /= np.sqrt(np.prod(inarray.shape[-dim:]))
+    return outarray
 
 
 def uirfftn(inarray, dim=None, shape=None):
@@ -182,7 +186,8 @@ def uirfftn(inarray, dim=None, shape=None):
     if dim is None:
         dim = inarray.ndim
     outarray = irfftn(inarray, shape, axes=range(-dim, 0))
-    return outarray * np.sqrt(np.prod(outarray.shape[-dim:]))
+    outarray *= np.sqrt(np.prod(outarray.shape[-dim:]))
+    return outarray
 
 
 def ufft2(inarray):